@@ -26,12 +26,30 @@ Implementación de un motor de análisis cuantitativo con:
   - Frontera eficiente con restricciones de posición
 """
 
+import os
+import sys
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    from numba import njit
+except ImportError:
+    # Sin numba: las funciones se ejecutan como Python/NumPy puro
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+try:
+    from scipy.linalg import cho_solve
+except ImportError:
+    cho_solve = None
+
 # ─────────────────────────────────────────────
 #  CONFIGURACIÓN DEL FONDO
 # ─────────────────────────────────────────────
@@ -40,7 +58,9 @@ AUM          = 500_000_000   # $500M Assets Under Management
 RISK_FREE    = 0.0525        # Fed Funds Rate vigente
 BENCHMARK    = "S&P 500"
 CONF_LEVEL   = 0.99          # VaR al 99%
+Z_99         = -2.326347874040841   # norm.ppf(0.01), cuantil del VaR 99%
 TRADE_DAYS   = 252
+HIST_DAYS    = 756           # 3 años de historia diaria
 
 # ─────────────────────────────────────────────
 #  UNIVERSO DE ACTIVOS (10 posiciones)
@@ -59,13 +79,19 @@ SECTOR = {
 CURRENT_WEIGHTS = np.array([0.18, 0.15, 0.12, 0.10, 0.08,
                              0.12, 0.08, 0.07, 0.05, 0.05])
 
-np.random.seed(42)
+# Generador PCG64 único, sembrado una vez y reutilizado por todo el módulo
+_RNG = np.random.default_rng(42)
+
+# Ruido idiosincrático del benchmark: stream hijo propio, así los precios
+# simulados no dependen de él; se genera una sola vez al cargar el módulo
+_BM_SEED  = np.random.SeedSequence(42).spawn(1)[0]
+_BM_NOISE = np.random.default_rng(_BM_SEED).normal(0, 0.003, HIST_DAYS)
 
 # ─────────────────────────────────────────────
 #  GENERACIÓN DE DATOS HISTÓRICOS SIMULADOS
 #  (Representan 3 años de precios diarios)
 # ─────────────────────────────────────────────
-def generate_price_data(n_days=756):
+def generate_price_data(n_days=HIST_DAYS, rng=_RNG):
     """Genera retornos simulados con correlaciones realistas."""
     # Retornos anualizados esperados por activo
     mu_annual = np.array([0.22, 0.20, 0.18, 0.25, 0.38,
@@ -92,78 +118,161 @@ def generate_price_data(n_days=756):
     ])
 
     # Cholesky decomposition para retornos correlacionados
+    # (shocks en float32 desde PCG64; la mezcla con L promueve a float64)
     L = np.linalg.cholesky(corr)
-    Z = np.random.standard_normal((n_days, len(TICKERS)))
-    corr_Z = Z @ L.T
-    returns = mu_daily + corr_Z * sigma_daily
+    Z = rng.standard_normal((n_days, len(TICKERS)), dtype=np.float32)
+    returns = np.einsum('ij,kj->ik', Z, L)     # Z @ L.T
+    returns *= sigma_daily
+    returns += mu_daily
 
     # Precios a partir de retornos
-    prices = 100 * np.cumprod(1 + returns, axis=0)
+    prices = 100 * np.exp(np.cumsum(np.log1p(returns), axis=0))
     dates = pd.date_range(end=datetime.today(), periods=n_days, freq='B')
-    return pd.DataFrame(returns, index=dates, columns=TICKERS), \
-           pd.DataFrame(prices,  index=dates, columns=TICKERS)
+    return returns, prices, dates
+
+# ─────────────────────────────────────────────
+#  ESTADÍSTICAS PRECALCULADAS
+# ─────────────────────────────────────────────
+@dataclass
+class RiskCache:
+    """Media y covarianza diarias calculadas una sola vez."""
+    returns: np.ndarray   # (T, N) retornos diarios, column-major
+    mu:      np.ndarray   # (N,)   media diaria
+    cov:     np.ndarray   # (N, N) covarianza diaria (ddof=1)
+    chol:    np.ndarray   # (N, N) Cholesky inferior de cov + (1e-8/252)·I
+    bm:      np.ndarray   # (T,)   retornos diarios del benchmark
+
+    @classmethod
+    def from_returns(cls, returns_arr):
+        # ndarray puro: las reducciones evitan el camino NaN-aware de pandas
+        returns_arr = np.asfortranarray(returns_arr, dtype=np.float64)
+        cov = np.cov(returns_arr, rowvar=False)
+        return cls(returns=returns_arr,
+                   mu=returns_arr.mean(axis=0),
+                   cov=cov,
+                   chol=np.linalg.cholesky(
+                       cov + np.eye(len(cov)) * (1e-8 / TRADE_DAYS)),
+                   bm=benchmark_returns(returns_arr))
+
+    def solve(self, b):
+        """(Σ + ridge)⁻¹b sobre la covarianza diaria, reutilizando el factor.
+
+        El ridge 1e-8/TRADE_DAYS equivale al 1e-8 sobre la matriz anualizada.
+        """
+        if cho_solve is not None:
+            return cho_solve((self.chol, True), b)
+        return np.linalg.solve(self.chol.T, np.linalg.solve(self.chol, b))
+
+    def port_stats(self, weights):
+        """Media y volatilidad diarias del portafolio."""
+        return weights @ self.mu, np.sqrt(weights @ self.cov @ weights)
 
 # ─────────────────────────────────────────────
 #  MÉTRICAS DE RIESGO
 # ─────────────────────────────────────────────
-def portfolio_metrics(weights, returns_df):
+def _project(weights, returns_arr):
+    """Retornos diarios del portafolio: (T,) para un vector de pesos o
+    (K, T) para K portafolios (K, N), en una sola pasada sobre los datos."""
+    weights, returns_arr = np.asarray(weights), np.asarray(returns_arr)
+    if weights.ndim == 2:
+        return np.ascontiguousarray((returns_arr @ weights.T).T)
+    return np.ascontiguousarray(returns_arr @ weights)
+
+def portfolio_metrics(port_returns):
     """Calcula retorno, volatilidad y Sharpe del portafolio."""
-    port_returns = returns_df @ weights
+    port_returns = np.asarray(port_returns, dtype=np.float64)
     ann_return   = port_returns.mean() * TRADE_DAYS
-    ann_vol      = port_returns.std()  * np.sqrt(TRADE_DAYS)
+    ann_vol      = port_returns.std(ddof=1) * np.sqrt(TRADE_DAYS)
     sharpe       = (ann_return - RISK_FREE) / ann_vol
     return ann_return, ann_vol, sharpe
 
-def calculate_var(weights, returns_df, confidence=0.99):
+def calculate_var(port_returns, confidence=CONF_LEVEL):
     """Value at Risk histórico y paramétrico."""
-    port_returns = (returns_df @ weights)
-    port_dollar  = port_returns * AUM
-
-    # VaR Histórico
-    var_hist = -np.percentile(port_dollar, (1 - confidence) * 100)
+    port_returns = np.asarray(port_returns, dtype=np.float64)
+    # VaR Histórico + CVaR: una selección O(T) de las k+1 peores pérdidas;
+    # sólo ese subconjunto se escala a dólares
+    k = int(np.floor((1 - confidence) * port_returns.size + 1e-9))
+    idx   = np.argpartition(port_returns, k)[:k + 1]
+    worst = port_returns[idx] * AUM
+    var_hist = -worst.max()
+    cvar     = -worst.mean()
 
     # VaR Paramétrico (normal)
-    from scipy.stats import norm
-    mu  = port_dollar.mean()
-    sig = port_dollar.std()
-    var_param = -(mu + norm.ppf(1 - confidence) * sig)
-
-    # CVaR (Expected Shortfall) - promedio de pérdidas peores que VaR
-    threshold  = np.percentile(port_dollar, (1 - confidence) * 100)
-    cvar       = -port_dollar[port_dollar <= threshold].mean()
+    if confidence == 0.99:
+        z = Z_99
+    else:
+        from scipy.stats import norm
+        z = norm.ppf(1 - confidence)
+    mu  = port_returns.mean() * AUM
+    sig = port_returns.std(ddof=1) * AUM
+    var_param = -(mu + z * sig)
 
     return var_hist, var_param, cvar
 
-def calculate_beta(weights, returns_df):
+def benchmark_returns(returns_arr):
+    """Retornos diarios del benchmark simulado (ruido determinístico)."""
+    returns_arr = np.asarray(returns_arr)
+    T = len(returns_arr)
+    # Historias más largas regeneran el mismo stream: _BM_NOISE es su prefijo
+    noise = _BM_NOISE[:T] if T <= HIST_DAYS else \
+            np.random.default_rng(_BM_SEED).normal(0, 0.003, T)
+    return returns_arr.mean(axis=1) * 0.85 + noise
+
+def calculate_beta(port_returns, bm_returns):
     """Beta del portafolio vs benchmark simulado."""
-    bm_returns = returns_df.mean(axis=1) * 0.85 + \
-                 np.random.normal(0, 0.003, len(returns_df))
-    port_returns = returns_df @ weights
-    cov_mat = np.cov(port_returns, bm_returns)
-    return cov_mat[0, 1] / cov_mat[1, 1]
+    port_returns = np.asarray(port_returns, dtype=np.float64)
+    bm_returns   = np.asarray(bm_returns, dtype=np.float64)
+    p    = port_returns - port_returns.mean()
+    bm_c = bm_returns - bm_returns.mean()
+    num = np.einsum('i,i->', p, bm_c)
+    den = np.einsum('i,i->', bm_c, bm_c)
+    return num / den
 
 # ─────────────────────────────────────────────
 #  OPTIMIZACIÓN MARKOWITZ (SCIPY)
 # ─────────────────────────────────────────────
-def optimize_portfolio(returns_df):
+@njit(cache=True, fastmath=True)
+def _neg_sharpe(w, mean_ret, cov_mat, rf):
+    """Sharpe negativo (objetivo a minimizar)."""
+    r = np.dot(w, mean_ret)
+    v = np.sqrt(np.dot(w, np.dot(cov_mat, w)))
+    return -(r - rf) / v
+
+@njit(cache=True, fastmath=True)
+def _grad_neg_sharpe(w, mean_ret, cov_mat, rf):
+    """Gradiente analítico de _neg_sharpe."""
+    r  = np.dot(w, mean_ret)
+    cw = np.dot(cov_mat, w)
+    v  = np.sqrt(np.dot(w, cw))
+    return -(mean_ret * v - (r - rf) * cw / v) / v**2
+
+def optimize_portfolio(cache):
     """Encuentra pesos óptimos maximizando Sharpe Ratio."""
     try:
         from scipy.optimize import minimize
 
         n = len(TICKERS)
-        mean_ret = returns_df.mean() * TRADE_DAYS
-        cov_mat  = returns_df.cov()  * TRADE_DAYS
-
-        def neg_sharpe(w):
-            r = w @ mean_ret
-            v = np.sqrt(w @ cov_mat.values @ w)
-            return -(r - RISK_FREE) / v
-
-        constraints = [{'type': 'eq', 'fun': lambda w: w.sum() - 1}]
+        mean_ret = cache.mu  * TRADE_DAYS
+        cov_mat  = cache.cov * TRADE_DAYS
+
+        # Portafolio tangente en forma cerrada: w ∝ Σ⁻¹(μ - rf).
+        # Sólo es el máximo Sharpe si 1ᵀΣ⁻¹(μ - rf) > 0; si no, es el mínimo.
+        x = cache.solve(mean_ret - RISK_FREE)
+        if x.sum() > 0:
+            w = x / x.sum()
+            if np.all((w >= 0.02 - 1e-12) & (w <= 0.25 + 1e-12)):
+                return w
+
+        # Restricciones activas: SLSQP con gradientes analíticos del
+        # objetivo y de la restricción Σw = 1 (sin diferencias finitas)
+        cov_mat = np.ascontiguousarray(cov_mat, dtype=np.float64)
+        constraints = [{'type': 'eq', 'fun': lambda w: w.sum() - 1,
+                        'jac': lambda w: np.ones(n)}]
         bounds = [(0.02, 0.25)] * n   # Entre 2% y 25% por posición
         w0 = np.ones(n) / n
 
-        result = minimize(neg_sharpe, w0, method='SLSQP',
+        result = minimize(_neg_sharpe, w0, method='SLSQP', jac=_grad_neg_sharpe,
+                         args=(mean_ret, cov_mat, RISK_FREE),
                          bounds=bounds, constraints=constraints,
                          options={'ftol': 1e-9, 'maxiter': 1000})
         return result.x if result.success else w0
@@ -171,33 +280,94 @@ def optimize_portfolio(returns_df):
     except ImportError:
         # Fallback sin scipy: pesos mínima varianza simplificados
         n = len(TICKERS)
-        cov_mat = returns_df.cov().values * TRADE_DAYS
-        ones = np.ones(n)
-        inv_cov = np.linalg.inv(cov_mat + np.eye(n) * 1e-8)
-        w = inv_cov @ ones / (ones @ inv_cov @ ones)
+        x = cache.solve(np.ones(n))
+        w = x / x.sum()
         w = np.clip(w, 0.02, 0.25)
         return w / w.sum()
 
+# ─────────────────────────────────────────────
+#  FRONTERA EFICIENTE (PARALELA)
+# ─────────────────────────────────────────────
+_FRONTIER = {}
+
+def _init_frontier(mean_ret, cov_mat, inv_ones, inv_mu):
+    """Inicializa cada worker con μ, Σ anualizados y Σ⁻¹1, Σ⁻¹μ."""
+    _FRONTIER.update(mu=mean_ret, cov=cov_mat,
+                     inv_ones=inv_ones, inv_mu=inv_mu)
+
+def _solve_frontier_point(target):
+    """Mínima varianza sujeta a w·μ = target, Σw = 1 y 2%-25% por posición."""
+    mu, cov = _FRONTIER['mu'], _FRONTIER['cov']
+    a, b = _FRONTIER['inv_ones'], _FRONTIER['inv_mu']
+    n = len(mu)
+
+    # Frontera sin límites de posición en forma cerrada: w = λΣ⁻¹1 + γΣ⁻¹μ
+    A, B, C = a.sum(), b.sum(), mu @ b
+    D = A * C - B**2
+    w = ((C - B * target) * a + (A * target - B) * b) / D
+    if np.all((w >= 0.02 - 1e-12) & (w <= 0.25 + 1e-12)):
+        return w
+
+    from scipy.optimize import minimize
+
+    constraints = [
+        {'type': 'eq', 'fun': lambda w: w.sum() - 1,
+         'jac': lambda w: np.ones(n)},
+        {'type': 'eq', 'fun': lambda w: w @ mu - target,
+         'jac': lambda w: mu},
+    ]
+    result = minimize(lambda w: w @ cov @ w, np.ones(n) / n,
+                      jac=lambda w: 2 * cov @ w, method='SLSQP',
+                      bounds=[(0.02, 0.25)] * n, constraints=constraints,
+                      options={'ftol': 1e-9, 'maxiter': 1000})
+    return result.x if result.success else np.full(n, np.nan)
+
+def sweep_frontier(cache, targets, min_pool=64):
+    """Pesos (K, N) de la frontera eficiente para K retornos objetivo.
+
+    Con menos de `min_pool` objetivos se resuelve en el proceso actual:
+    arrancar el pool cuesta más que resolver unos pocos puntos.
+    """
+    n = len(cache.mu)
+    if len(targets) == 0:
+        return np.empty((0, n))
+
+    # Sólo viajan a los workers N + N² floats y dos soluciones con el
+    # factor de Cholesky ya calculado (Σ_anual⁻¹ = Σ_diaria⁻¹ / TRADE_DAYS)
+    initargs = (cache.mu * TRADE_DAYS, cache.cov * TRADE_DAYS,
+                cache.solve(np.ones(n)) / TRADE_DAYS,
+                cache.solve(cache.mu))
+    if len(targets) < min_pool:
+        _init_frontier(*initargs)
+        return np.array([_solve_frontier_point(t) for t in targets])
+
+    workers = min(os.cpu_count() or 1, len(targets))
+    chunk   = max(1, len(targets) // workers)
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_frontier,
+                             initargs=initargs) as ex:
+        return np.array(list(ex.map(_solve_frontier_point, targets,
+                                    chunksize=chunk)))
+
 # ─────────────────────────────────────────────
 #  SIMULACIÓN MONTE CARLO
 # ─────────────────────────────────────────────
-def monte_carlo(weights, returns_df, n_sim=10000, horizon=252):
+def monte_carlo(mu, sig, n_sim=10000, horizon=252, rng=_RNG):
     """Simula distribución de valor del portafolio a 1 año."""
-    mu  = (returns_df @ weights).mean()
-    sig = (returns_df @ weights).std()
-    simulated = AUM * np.exp(
-        np.random.normal(
-            (mu - 0.5 * sig**2) * horizon,
-            sig * np.sqrt(horizon),
-            n_sim
-        )
-    )
-    return simulated
+    drift = float((mu - 0.5 * sig**2) * horizon)
+    vol   = float(sig * np.sqrt(horizon))
+    # Un único buffer float32: Z → drift + vol·Z → exp → AUM·exp
+    Z = rng.standard_normal(n_sim, dtype=np.float32)
+    np.multiply(Z, vol, out=Z)
+    Z += drift
+    np.exp(Z, out=Z)
+    Z *= AUM
+    return Z
 
 # ─────────────────────────────────────────────
 #  REPORTE EJECUTIVO EN CONSOLA
 # ─────────────────────────────────────────────
-def print_report(returns_df, prices_df, opt_weights):
+def print_report(cache, prices_arr, opt_weights):
     SEP = "═" * 68
 
     print(f"\n{SEP}")
@@ -206,9 +376,13 @@ def print_report(returns_df, prices_df, opt_weights):
     print(SEP)
 
     # ── Métricas portafolio actual
-    cr, cv, cs = portfolio_metrics(CURRENT_WEIGHTS, returns_df)
-    vH, vP, cvar = calculate_var(CURRENT_WEIGHTS, returns_df)
-    beta_curr = calculate_beta(CURRENT_WEIGHTS, returns_df)
+    returns_arr = cache.returns
+    bm_returns  = cache.bm
+    port_curr, port_opt = _project(np.vstack([CURRENT_WEIGHTS, opt_weights]),
+                                   returns_arr)
+    cr, cv, cs = portfolio_metrics(port_curr)
+    vH, vP, cvar = calculate_var(port_curr)
+    beta_curr = calculate_beta(port_curr, bm_returns)
 
     print("\n📊 PORTAFOLIO ACTUAL (Situación Problema)")
     print(f"   Retorno Anualizado  : {cr:>8.2%}")
@@ -220,9 +394,9 @@ def print_report(returns_df, prices_df, opt_weights):
     print(f"   CVaR 99% (1 día)    : ${cvar/1e6:>7.2f}M  (Expected Shortfall)")
 
     # ── Métricas portafolio optimizado
-    or_, ov, os_ = portfolio_metrics(opt_weights, returns_df)
-    vH2, vP2, cvar2 = calculate_var(opt_weights, returns_df)
-    beta_opt = calculate_beta(opt_weights, returns_df)
+    or_, ov, os_ = portfolio_metrics(port_opt)
+    vH2, vP2, cvar2 = calculate_var(port_opt)
+    beta_opt = calculate_beta(port_opt, bm_returns)
 
     print(f"\n✅ PORTAFOLIO OPTIMIZADO (Solución Markowitz)")
     print(f"   Retorno Anualizado  : {or_:>8.2%}  (+{(or_-cr)*100:.0f}bps)")
@@ -236,15 +410,17 @@ def print_report(returns_df, prices_df, opt_weights):
     print(f"\n📋 ASIGNACIÓN DE ACTIVOS — ACTUAL vs ÓPTIMA")
     print(f"   {'Ticker':<8} {'Sector':<28} {'Actual':>8} {'Óptimo':>8} {'Δ Cambio':>10}")
     print(f"   {'─'*8} {'─'*28} {'─'*8} {'─'*8} {'─'*10}")
-    for i, t in enumerate(TICKERS):
-        delta = opt_weights[i] - CURRENT_WEIGHTS[i]
-        arrow = "▲" if delta > 0.01 else ("▼" if delta < -0.01 else "─")
-        print(f"   {t:<8} {SECTOR[t]:<28} {CURRENT_WEIGHTS[i]:>7.1%} "
-              f"{opt_weights[i]:>7.1%} {arrow}{abs(delta):>8.1%}")
+    deltas = opt_weights - CURRENT_WEIGHTS
+    arrows = np.where(deltas > 0.01, "▲", np.where(deltas < -0.01, "▼", "─"))
+    rows = [f"   {t:<8} {SECTOR[t]:<28} {cw:>7.1%} {ow:>7.1%} {a}{abs(d):>8.1%}"
+            for t, cw, ow, a, d in zip(TICKERS, CURRENT_WEIGHTS, opt_weights,
+                                       arrows, deltas)]
+    sys.stdout.write('\n'.join(rows) + '\n')
 
     # ── Monte Carlo
-    sims = monte_carlo(opt_weights, returns_df)
-    p5, p50, p95 = np.percentile(sims, [5, 50, 95])
+    sims = monte_carlo(*cache.port_stats(opt_weights))
+    k = [int(q * (sims.size - 1)) for q in (0.05, 0.50, 0.95)]
+    p5, p50, p95 = np.partition(sims, k)[k]
     print(f"\n🎲 SIMULACIÓN MONTE CARLO — Proyección 12 meses (10,000 escenarios)")
     print(f"   Caso Pesimista  (P5) : ${p5/1e6:>7.1f}M  (retorno: {(p5/AUM-1):+.1%})")
     print(f"   Caso Base      (P50) : ${p50/1e6:>7.1f}M  (retorno: {(p50/AUM-1):+.1%})")
@@ -267,25 +443,34 @@ def print_report(returns_df, prices_df, opt_weights):
         'mc': {'p5': p5, 'p50': p50, 'p95': p95}
     }
 
+# ─────────────────────────────────────────────
+#  EXPORTACIÓN
+# ─────────────────────────────────────────────
+def export_frame(arr, dates, path_stem):
+    """Exporta una serie (T, N) a Parquet; CSV si no hay motor Parquet."""
+    df = pd.DataFrame(arr, index=dates, columns=TICKERS)
+    try:
+        df.to_parquet(f'{path_stem}.parquet', compression='snappy')
+    except ImportError:
+        df.to_csv(f'{path_stem}.csv')
+
 # ─────────────────────────────────────────────
 #  MAIN
 # ─────────────────────────────────────────────
 if __name__ == "__main__":
     print("⚙️  Cargando datos históricos y optimizando portafolio...")
-    returns_df, prices_df = generate_price_data()
-    opt_weights = optimize_portfolio(returns_df)
-    results = print_report(returns_df, prices_df, opt_weights)
+    returns_arr, prices_arr, dates = generate_price_data()
+    cache = RiskCache.from_returns(returns_arr)
+    opt_weights = optimize_portfolio(cache)
+    results = print_report(cache, prices_arr, opt_weights)
     print("✅  Análisis completado. Exportando datos para Excel y Java...")
 
     # Exportar para uso del Excel builder
     np.save('/home/claude/hedge_fund/opt_weights.npy', opt_weights)
-    returns_df.to_csv('/home/claude/hedge_fund/returns_data.csv')
-    prices_df.to_csv('/home/claude/hedge_fund/prices_data.csv')
-
-    import json
-    with open('/home/claude/hedge_fund/results.json', 'w') as f:
-        json.dump({k: {kk: float(vv) for kk, vv in v.items()}
-                   if isinstance(v, dict) else v
-                   for k, v in results.items()
-                   if k != 'opt_weights'}, f, indent=2)
+    export_frame(returns_arr, dates, '/home/claude/hedge_fund/returns_data')
+    export_frame(prices_arr,  dates, '/home/claude/hedge_fund/prices_data')
+
+    np.savez('/home/claude/hedge_fund/results.npz',
+             **{f'{k}_{kk}': vv for k, v in results.items()
+                if isinstance(v, dict) for kk, vv in v.items()})
     print("📁  Archivos exportados correctamente.\n")